@@ -1,20 +1,38 @@
-import json
+import asyncio
+import logging
+import os
+import sys
+
+import orjson
 
 from todoist.scenes import SCENES, DEFAULT_SCENE
 from todoist.request import Request
 
+logging.basicConfig(stream=sys.stdout)
+logger = logging.getLogger(__name__)
+log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logger.setLevel(log_level if log_level in logging.getLevelNamesMapping() else logging.INFO)
+
+# Цикл событий переиспользуется между "тёплыми" вызовами функции
+loop = asyncio.new_event_loop()
+
 
 def handler(event, context):
-    print('Incoming request: ' + json.dumps(event))
+    return loop.run_until_complete(handle(event, context))
+
+
+async def handle(event, context):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Incoming request: %s', orjson.dumps(event).decode())
     request = Request(event)
     current_scene_id = request.session.get('scene')
     if current_scene_id is None:
-        return DEFAULT_SCENE().reply(request)
+        return await DEFAULT_SCENE().reply(request)
     current_scene = SCENES.get(current_scene_id, DEFAULT_SCENE)()
-    next_scene = current_scene.move(request)
+    next_scene = await current_scene.move(request)
     if next_scene is not None:
-        print(f'Moving from scene {current_scene.id()} to {next_scene.id()}')
-        return next_scene.reply(request)
+        logger.debug('Moving from scene %s to %s', current_scene.id(), next_scene.id())
+        return await next_scene.reply(request)
     else:
-        print(f'Failed to parse user request at scene {current_scene.id()}')
+        logger.info('Failed to parse user request at scene %s', current_scene.id())
         return current_scene.fallback(request)
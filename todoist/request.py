@@ -1,5 +1,10 @@
+from types import MappingProxyType
+
 from todoist.state import STATE_REQUEST_KEY
 
+# Общий пустой словарь (только для чтения) для цепочек .get(), чтобы не создавать новый на каждый промах
+EMPTY = MappingProxyType({})
+
 
 class Request:
     def __init__(self, request_body):
@@ -10,12 +15,17 @@ class Request:
 
     @property
     def intents(self):
-        return self.request_body['request'].get('nlu', {}).get('intents', {})
+        return self.request_body['request'].get('nlu', EMPTY).get('intents', EMPTY)
 
     @property
     def type(self):
-        return self.request_body.get('request', {}).get('type')
+        return self.request_body.get('request', EMPTY).get('type')
 
     @property
     def session(self):
-        return self.request_body.get('state', {}).get(STATE_REQUEST_KEY, {})
+        return self.request_body.get('state', EMPTY).get(STATE_REQUEST_KEY, EMPTY)
+
+    @property
+    def user_id(self):
+        session = self.request_body.get('session', EMPTY)
+        return session.get('user', EMPTY).get('user_id') or session.get('application', EMPTY).get('application_id')
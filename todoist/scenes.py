@@ -1,17 +1,32 @@
 import enum
-import inspect
-import sys
+import functools
 import os
+import time
 from abc import ABC, abstractmethod
 from typing import Optional
 
 from todoist import intents
-from todoist.request import Request
+from todoist.request import EMPTY, Request
 from todoist.state import STATE_RESPONSE_KEY
 
-from todoist_api_python.api import TodoistAPI
+import orjson
+from cachetools import TTLCache
+from todoist_api_python.api_async import TodoistAPIAsync
 
-api = TodoistAPI(os.environ.get('TODOIST_APP_TOKEN'))
+
+@functools.cache
+def get_api():
+    return TodoistAPIAsync(os.environ['TODOIST_APP_TOKEN'])
+
+
+# Списки задач по ключу (пользователь, фильтр), живут 30 секунд
+TASKS_TTL = 30
+tasks_cache = TTLCache(maxsize=1024, ttl=TASKS_TTL)
+
+# Состояние сессии в Яндекс Диалогах ограничено 1 КБ, оставляем запас под остальные ключи
+SESSION_TASKS_MAX_SIZE = 800
+
+SCENES = {}
 
 
 class TaskFilter(enum.Enum):
@@ -20,52 +35,86 @@ class TaskFilter(enum.Enum):
 
     @classmethod
     def from_request(cls, request: Request, intent_name: str):
-        time_from_intent = request.intents[intent_name].get('slots', {}).get('time', {}).get('value')
-        current_filter = time_from_intent or request.session.get('time', {}).get('value')
-        if current_filter == 'today':
-            return cls.TODAY
-        elif current_filter == 'tomorrow':
-            return cls.TOMORROW
+        intent = request.intents[intent_name]
+        try:
+            time_from_intent = intent['slots']['time']['value']
+        except KeyError:
+            time_from_intent = None
+        current_filter = time_from_intent or request.session.get('time', EMPTY).get('value')
+        return _FILTER_MAP.get(current_filter)
 
 
-class TaskPosition(enum.Enum):
-    @classmethod
-    def from_request(cls, request: Request):
-        slot = request.session.get('position', {}).get('value', 0)
+_FILTER_MAP = {task_filter.value: task_filter for task_filter in TaskFilter}
 
-        return slot
+
+def task_position_from_request(request: Request):
+    slot = request.session.get('position', EMPTY).get('value', 0)
+
+    return int(slot) if str(slot).isdigit() else 0
 
 
 def move_to_position(request: Request):
-    position = TaskPosition.from_request(request)
+    position = task_position_from_request(request)
 
     return position
 
 
+async def get_tasks(request: Request, task_filter: str):
+    key = (request.user_id, task_filter)
+    cached = tasks_cache.get(key)
+    if cached is None:
+        tasks = await get_api().get_tasks(filter=task_filter)
+        cached = tasks_cache[key] = (tasks, time.time())
+    return cached
+
+
+def session_tasks(request: Request, task_filter: str):
+    session = request.session
+    if session.get('time', EMPTY).get('value') != task_filter:
+        return None
+    if time.time() - session.get('fetched_at', 0) >= TASKS_TTL:
+        return None
+    return session.get('tasks')
+
+
+def fits_session(tasks):
+    return len(orjson.dumps(tasks)) <= SESSION_TASKS_MAX_SIZE
+
+
 class Scene(ABC):
+    __slots__ = ()
+    _ID = 'Scene'
+    _STATE_TEMPLATE = {'scene': _ID}
+
+    def __init_subclass__(cls, register=True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ID = cls.__name__
+        cls._STATE_TEMPLATE = {'scene': cls._ID}
+        if register:
+            SCENES[cls._ID] = cls
 
     @classmethod
     def id(cls):
-        return cls.__name__
+        return cls._ID
 
     """Генерация ответа сцены"""
     @abstractmethod
-    def reply(self, request):
+    async def reply(self, request):
         raise NotImplementedError()
 
     """Проверка перехода к новой сцене"""
-    def move(self, request: Request):
-        next_scene = self.handle_local_intents(request)
+    async def move(self, request: Request):
+        next_scene = await self.handle_local_intents(request)
         if next_scene is None:
-            next_scene = self.handle_global_intents(request)
+            next_scene = await self.handle_global_intents(request)
         return next_scene
 
     @abstractmethod
-    def handle_global_intents(self, request: Request):
+    async def handle_global_intents(self, request: Request):
         raise NotImplementedError()
 
     @abstractmethod
-    def handle_local_intents(self, request: Request) -> Optional[str]:
+    async def handle_local_intents(self, request: Request) -> Optional[str]:
         raise NotImplementedError()
 
     def fallback(self, request: Request):
@@ -82,65 +131,65 @@ class Scene(ABC):
             response['buttons'] = buttons
         if directives is not None:
             response['directives'] = directives
-        webhook_response = {
+        return {
             'response': response,
             'version': '1.0',
-            STATE_RESPONSE_KEY: {
-                'scene': self.id(),
-            },
+            STATE_RESPONSE_KEY: {**self._STATE_TEMPLATE, **state} if state else self._STATE_TEMPLATE.copy(),
         }
-        if state is not None:
-            webhook_response[STATE_RESPONSE_KEY].update(state)
-        return webhook_response
 
 
-class TodoistScene(Scene):
-    def handle_global_intents(self, request):
-        if intents.GET_NEAREST_TASKS in request.intents:
-            return TasksList()
+class TodoistScene(Scene, register=False):
+    __slots__ = ()
+
+    async def handle_global_intents(self, request):
+        for intent_name, scene in GLOBAL_INTENT_ROUTES.items():
+            if intent_name in request.intents:
+                return scene()
 
 
 class Welcome(TodoistScene):
-    def reply(self, request: Request):
+    __slots__ = ()
+
+    async def reply(self, request: Request):
         text = 'Привет! Я помогу управлять вашими задачами в Todoist.'
         tts = 'Привет! Я помогу управлять вашими задачами в Tod+oist.'
         return self.make_response(text, tts=tts)
 
-    def handle_local_intents(self, request: Request):
+    async def handle_local_intents(self, request: Request):
         pass
 
 
 class TasksList(TodoistScene):
-    def reply(self, request: Request):
+    __slots__ = ()
+
+    async def reply(self, request: Request):
         current_filter = TaskFilter.from_request(request, intents.GET_NEAREST_TASKS).value
-        tasks = api.get_tasks(filter=current_filter)
+        state = {'time': {'value': current_filter}}
+        tasks = session_tasks(request, current_filter)
+        if tasks is None:
+            fetched, fetched_at = await get_tasks(request, current_filter)
+            tasks = [{'id': task.id, 'content': task.content} for task in fetched]
+            if fits_session(tasks):
+                state['tasks'] = tasks
+                state['fetched_at'] = fetched_at
+        else:
+            state['tasks'] = tasks
+            state['fetched_at'] = request.session['fetched_at']
         tasks_count = len(tasks)
 
-        texts = [f"Сейчас у вас {tasks_count} задач в списке:"]
-
-        for index, task in enumerate(tasks):
-            position = index + 1
-            texts.append(f"\n- {position}: {task.content}.")
-
-        text = " ".join(texts)
+        text = " ".join([
+            f"Сейчас у вас {tasks_count} задач в списке:",
+            *(f"\n- {position}: {task['content']}." for position, task in enumerate(tasks, start=1)),
+        ])
 
-        return self.make_response(text)
+        return self.make_response(text, state=state)
 
-    def handle_local_intents(self, request: Request):
+    async def handle_local_intents(self, request: Request):
         pass
 
 
-def _list_scenes():
-    current_module = sys.modules[__name__]
-    scenes = []
-    for name, obj in inspect.getmembers(current_module):
-        if inspect.isclass(obj) and issubclass(obj, Scene):
-            scenes.append(obj)
-    return scenes
-
-
-SCENES = {
-    scene.id(): scene for scene in _list_scenes()
+GLOBAL_INTENT_ROUTES = {
+    intents.GET_NEAREST_TASKS: TasksList,
 }
 
 DEFAULT_SCENE = Welcome